@@ -1,5 +1,6 @@
 import torch
 import cxp_dataset as CXP
+import model_utils as U
 
 class AssembledModel():
 
@@ -12,15 +13,10 @@ class AssembledModel():
             PATH_TO_IMAGES,
             PATH_TO_CSV):
 
-        checkpoint_lat = torch.load(PATH_TO_LAT, map_location=lambda storage, loc: storage)
-        checkpoint_pa = torch.load(PATH_TO_PA, map_location=lambda storage, loc: storage)
-        checkpoint_ap = torch.load(PATH_TO_AP, map_location=lambda storage, loc: storage)
-        checkpoint_orient = torch.load(PATH_TO_ORIENT, map_location=lambda storage, loc: storage)
-
-        self.model_lat = checkpoint_lat['model']
-        self.model_pa = checkpoint_pa['model']
-        self.model_ap = checkpoint_ap['model']
-        self.model_orient = checkpoint_orient['model']
+        self.model_lat = U.load_model(PATH_TO_LAT)
+        self.model_pa = U.load_model(PATH_TO_PA)
+        self.model_ap = U.load_model(PATH_TO_AP)
+        self.model_orient = U.load_model(PATH_TO_ORIENT)
         
         # put models on GPU
         self.model_lat.cuda()
@@ -48,15 +44,15 @@ class AssembledModel():
         
         scores = torch.zeros(size, 5)
         
-        score_ap = self.model_ap(input).cpu()
-        score_pa = self.model_pa(input).cpu()
-        score_lat = self.model_lat(input).cpu()
+        score_ap = U.to_probs(self.model_ap, self.model_ap(input)).cpu()
+        score_pa = U.to_probs(self.model_pa, self.model_pa(input)).cpu()
+        score_lat = U.to_probs(self.model_lat, self.model_lat(input)).cpu()
         
         scores[orientation==0, :] = score_ap[orientation==0]
         scores[orientation==1, :] = score_pa[orientation==1]
         scores[orientation==2, :] = score_lat[orientation==2]
         
-        probs = scores.data.numpy()
+        probs = scores.detach().numpy()
         
         return probs
         
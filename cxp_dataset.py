@@ -118,6 +118,9 @@ class CXPDataset(Dataset):
 
         self.df = self.df.set_index("Path")
         
+        # plain array of image paths so per-sample lookups skip pandas indexing
+        self.image_paths = self.df.index.to_numpy()
+        
         if orientation != 'trainer':
             self.PRED_LABEL = [
                 'Cardiomegaly',
@@ -152,14 +155,14 @@ class CXPDataset(Dataset):
         image = Image.open(
             os.path.join(
                 self.path_to_images,
-                self.df.index[idx]))
+                self.image_paths[idx]))
         image = image.convert('RGB')
         
         if self.transform:
             image = self.transform(image)
         
         if self.fold == None:
-            return (image, 0, self.df.index[idx])
+            return (image, 0, self.image_paths[idx])
 
         if self.orientation != 'trainer':
             label = np.zeros(len(self.PRED_LABEL), dtype=int)
@@ -180,4 +183,4 @@ class CXPDataset(Dataset):
                 label = 0
                 
 
-        return (image, label, self.df.index[idx])
+        return (image, label, self.image_paths[idx])
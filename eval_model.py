@@ -1,18 +1,129 @@
+import os
 import torch
 import pandas as pd
 import cxp_dataset as CXP
+import model_utils as U
 from torchvision import transforms, utils
 from torch.utils.data import Dataset, DataLoader
 from torchvision import transforms, utils
 import sklearn
 import sklearn.metrics as sklm
-from sklearn.preprocessing import label_binarize
-from torch.autograd import Variable
 import numpy as np
 
 ORIENTATION = ['AP', 'PA', '0']
 
-def make_pred_multilabel(data_transforms, model, PATH_TO_IMAGES, PATH_TO_CSV, metric, multiclass=False, dataset=None, verbose=False):
+LABELS = [
+    'No Finding',
+    'Enlarged Cardiomediastinum',
+    'Cardiomegaly',
+    'Lung Opacity',
+    'Lung Lesion',
+    'Edema',
+    'Consolidation',
+    'Pneumonia',
+    'Atelectasis',
+    'Pneumothorax',
+    'Pleural Effusion',
+    'Pleural Other',
+    'Fracture',
+    'Support Devices']
+
+# leave a couple of cores free for the main process, cap at 8 workers
+NUM_WORKERS = max(1, min((os.cpu_count() or 1) - 2, 8))
+
+def collect_predictions(model, dataloader, multiclass=False):
+    """
+    Runs model over a dataloader and gathers probabilities and ground truth on GPU
+
+    Args:
+        model: densenet-121 from torchvision previously fine tuned to training data
+        dataloader: unshuffled dataloader over the dataset to predict on
+        multiclass: True if model predicts orientation classes rather than labels
+    Returns:
+        probs_all: N x C tensor of predicted probabilities
+        labels_all: N x C tensor of ground truth, one-hot encoded if multiclass
+    """
+    # set model to eval mode; required for proper predictions given use of batchnorm
+    model.train(False)
+
+    size = len(dataloader.dataset)
+    if not multiclass:
+        n_classes = len(dataloader.dataset.PRED_LABEL)
+    else:
+        n_classes = len(ORIENTATION)
+
+    # preallocate outputs and fill them by slice per batch
+    probs_all = torch.empty((size, n_classes), device='cuda')
+    labels_all = torch.empty((size, n_classes), dtype=torch.int8, device='cuda')
+    offset = 0
+
+    # iterate over dataloader; no gradients needed for inference
+    with torch.no_grad():
+        for data in dataloader:
+
+            inputs, labels, _ = data
+        
+            inputs = inputs.cuda(non_blocking=True)
+            labels = labels.cuda(non_blocking=True)
+        
+            if multiclass:
+                labels = torch.nn.functional.one_hot(labels, n_classes)
+        
+            batch_size = inputs.shape[0]
+
+            # convert outputs to probabilities in full precision
+            with torch.autocast('cuda'):
+                outputs = model(inputs)
+            outputs = U.to_probs(model, outputs.float(), multiclass=multiclass)
+
+            probs_all[offset:offset + batch_size] = outputs
+            labels_all[offset:offset + batch_size] = labels
+            offset += batch_size
+
+            #if(offset % (10 * batch_size) == 0):
+            #    print('eval_model: ' + str(offset))
+
+    return probs_all, labels_all
+
+
+def compute_metrics(y_true, y_score, cols, metric, verbose=False):
+    """
+    Calculates per label AUC or F1 from ground truth and predicted probabilities
+
+    Args:
+        y_true: N x C numpy array of ground truth labels
+        y_score: N x C numpy array of predicted probabilities
+        cols: names of the C labels
+        metric: 'auc' or 'f1'
+    Returns:
+        metric_df: dataframe containing the metric for each label
+    """
+    if (metric == 'auc'):
+        try:
+            aucs = sklm.roc_auc_score(y_true, y_score, average=None)
+        except BaseException:
+            # a label with only one class present fails the batched call,
+            # fall back to scoring labels one at a time
+            aucs = np.full(len(cols), np.nan)
+            for k, column in enumerate(cols):
+                try:
+                    aucs[k] = sklm.roc_auc_score(y_true[:, k], y_score[:, k])
+                except BaseException:
+                    if verbose:
+                        print("can't calculate auc for " + str(column))
+        return pd.DataFrame({"label": cols, "auc": aucs}, columns=["label", "auc"])
+    elif (metric == 'f1'):
+        f1s = np.full(len(cols), np.nan)
+        for k, column in enumerate(cols):
+            try:
+                f1s[k] = sklm.f1_score(y_true[:, k], y_score[:, k] >= 0.5)
+            except BaseException:
+                if verbose:
+                    print("can't calculate f1 for " + str(column))
+        return pd.DataFrame({"label": cols, "f1": f1s}, columns=["label", "f1"])
+
+
+def make_pred_multilabel(data_transforms, model, PATH_TO_IMAGES, PATH_TO_CSV, metric, multiclass=False, dataset=None, verbose=False, BATCH_SIZE=64, dataloader=None):
     """
     Gives predictions for test fold and calculates AUCs using previously trained model
 
@@ -20,153 +131,69 @@ def make_pred_multilabel(data_transforms, model, PATH_TO_IMAGES, PATH_TO_CSV, me
         data_transforms: torchvision transforms to preprocess raw images; same as validation transforms
         model: densenet-121 from torchvision previously fine tuned to training data
         PATH_TO_IMAGES: path at which NIH images can be found
+        BATCH_SIZE: number of images per eval batch, can reduce if your GPU has less RAM
+        dataloader: unshuffled dataloader to predict on; built from dataset if not provided
     Returns:
         pred_df: dataframe containing individual predictions and ground truth for each test image
         auc_df: dataframe containing aggregate AUCs by train/test tuples
     """
     if metric not in ['auc', 'f1']:
         print("make_pred_multilabel: invalid metric:", metric)
-    
-    # calc preds in batches of 16, can reduce if your GPU has less RAM
-    BATCH_SIZE = 16
-
-    # set model to eval mode; required for proper predictions given use of batchnorm
-    model.train(False)
 
     # create dataloader on val set if not provided
-    if dataset == None:
-        dataset = CXP.CXPDataset(
-            path_to_images=PATH_TO_IMAGES,
-            path_to_csv=PATH_TO_CSV,
-            fold="val",
-            transform=data_transforms['val'])
+    if dataloader != None:
+        dataset = dataloader.dataset
+    else:
+        if dataset == None:
+            dataset = CXP.CXPDataset(
+                path_to_images=PATH_TO_IMAGES,
+                path_to_csv=PATH_TO_CSV,
+                fold="val",
+                transform=data_transforms['val'])
         
-    dataloader = torch.utils.data.DataLoader(
-        dataset, BATCH_SIZE, shuffle=False, num_workers=8)
+        dataloader = torch.utils.data.DataLoader(
+            dataset, BATCH_SIZE, shuffle=False, num_workers=NUM_WORKERS, pin_memory=True)
     size = len(dataset)
     
     print('Evaluating on', size, 'samples')
-    print("Model train: ", model.training)
 
-    # create empty dfs
-    pred_df = pd.DataFrame(columns=["Image Index"])
-    true_df = pd.DataFrame(columns=["Image Index"])
+    probs_all, labels_all = collect_predictions(model, dataloader, multiclass=multiclass)
+    print("Model train: ", model.training)
 
-    # iterate over dataloader
-    for i, data in enumerate(dataloader):
+    # each entry in prediction vector corresponds to individual label
+    if not multiclass:
+        label_cols = list(dataset.PRED_LABEL)
+    else:
+        label_cols = list(ORIENTATION)
+    prob_cols = ["prob_" + label for label in label_cols]
 
-        inputs, labels, _ = data
-        
-        inputs, labels = Variable(inputs.cuda()), Variable(labels.cuda())
-
-        true_labels = labels.cpu().data.numpy()
-        
-        if multiclass:
-            binary_labels = label_binarize(true_labels, classes=[0, 1, 2])
-        
-        batch_size = true_labels.shape
+    # build dfs once from the full prediction and label matrices
+    image_index = dataset.image_paths
+    pred_df = pd.DataFrame(probs_all.cpu().numpy(), columns=prob_cols)
+    pred_df.insert(0, "Image Index", image_index)
+    true_df = pd.DataFrame(labels_all.cpu().numpy(), columns=label_cols)
+    true_df.insert(0, "Image Index", image_index)
 
-        outputs = model(inputs)
-        probs = outputs.cpu().data.numpy()
-        
-        #print(probs)
-        #print(binary_labels)
-
-        # get predictions and true values for each item in batch
-        for j in range(0, batch_size[0]):
-            thisrow = {}
-            truerow = {}
-            #print(dataset.df.index[BATCH_SIZE * i + j])
-            thisrow["Image Index"] = dataset.df.index[BATCH_SIZE * i + j]
-            truerow["Image Index"] = dataset.df.index[BATCH_SIZE * i + j]
-
-            # iterate over each entry in prediction vector; each corresponds to
-            # individual label
-            if not multiclass:
-                for k in range(len(dataset.PRED_LABEL)):
-                    thisrow["prob_" + dataset.PRED_LABEL[k]] = probs[j, k]
-                    truerow[dataset.PRED_LABEL[k]] = true_labels[j, k]
-                
-            # iterate over each entry in prediction vector; each corresponds to
-            # individual label
-            else:       
-                for k in range(probs.shape[1]):
-                    thisrow["prob_" + ORIENTATION[k]] = probs[j, k]
-                    truerow[ORIENTATION[k]] = binary_labels[j, k]
-                    
-            #print('thisrow:', thisrow)
-            #print('truerow:', truerow)
-
-            pred_df = pred_df.append(thisrow, ignore_index=True)
-            true_df = true_df.append(truerow, ignore_index=True)
-
-        #if(i % 10 == 0):
-        #    print('eval_model: ' + str(i * BATCH_SIZE))
-
-            
-    if (metric == 'auc'):
-        auc_df = pd.DataFrame(columns=["label", "auc"])
-    elif (metric == 'f1'):
-        f1_df = pd.DataFrame(columns=["label", "f1"])
-        
     #print('true_df: ', true_df)
     #print('pred_df: ', pred_df)
 
-    # calc accuracies
-    for column in true_df:
-
-        if not multiclass and column not in [
-            'No Finding',
-            'Enlarged Cardiomediastinum',
-            'Cardiomegaly',
-            'Lung Opacity',
-            'Lung Lesion',
-            'Edema',
-            'Consolidation',
-            'Pneumonia',
-            'Atelectasis',
-            'Pneumothorax',
-            'Pleural Effusion',
-            'Pleural Other',
-            'Fracture',
-            'Support Devices']:
-                    continue
-        if multiclass and column not in ['AP', 'PA', '0']:
-            continue
-        actual = true_df[column]
-        pred = pred_df["prob_" + column]
-        thisrow = {}
-        thisrow['label'] = column
-        
-        if (metric == 'auc'):
-            thisrow['auc'] = np.nan
-            try:
-                thisrow['auc'] = sklm.roc_auc_score(
-                    actual.as_matrix().astype(int), pred.as_matrix())
-            except BaseException:
-                if verbose:
-                    print("can't calculate auc for " + str(column))
-            auc_df = auc_df.append(thisrow, ignore_index=True)
-        elif (metric == 'f1'):
-            thisrow['f1'] = np.nan
-            thisrow['f1'] = sklm.f1_score(
-                    actual.as_matrix().astype(int), pred.as_matrix())
-            try:
-                thisrow['f1'] = sklm.f1_score(
-                    actual.as_matrix().astype(int), pred.as_matrix())
-            except BaseException:
-                if verbose:
-                    print("can't calculate f1 for " + str(column))
-            f1_df = f1_df.append(thisrow, ignore_index=True)
-            
+    # calc accuracies on all labels at once
+    if not multiclass:
+        cols = [column for column in label_cols if column in LABELS]
+    else:
+        cols = [column for column in label_cols if column in ORIENTATION]
+
+    y_true = true_df[cols].to_numpy().astype(np.int8)
+    y_score = pred_df[["prob_" + column for column in cols]].to_numpy()
+
+    metric_df = compute_metrics(y_true, y_score, cols, metric, verbose=verbose)
 
     pred_df.to_csv("results/preds.csv", index=False)
     
     if (metric == 'auc'):
-        auc_df.to_csv("results/aucs.csv", index=False)
-        return pred_df, auc_df
+        metric_df.to_csv("results/aucs.csv", index=False)
     elif (metric == 'f1'):
-        f1_df.to_csv("results/f1.csv", index=False)
-        return pred_df, f1_df
+        metric_df.to_csv("results/f1.csv", index=False)
+    return pred_df, metric_df
     
     
@@ -5,11 +5,11 @@ import torch
 import torch.nn as nn
 import torch.optim as optim
 from torch.optim import lr_scheduler
-from torch.autograd import Variable
 import torchvision
 from torchvision import datasets, models, transforms
 from torch.utils.data import Dataset, DataLoader
 from torchvision import transforms, utils
+from torchvision.transforms import v2
 
 # image imports
 from skimage import io, transform
@@ -17,6 +17,7 @@ from PIL import Image
 
 # general imports
 import os
+import logging
 import time
 from shutil import copyfile
 from shutil import rmtree
@@ -28,18 +29,49 @@ import csv
 
 import cxp_dataset as CXP
 import eval_model as E
+import model_utils as U
 
 use_gpu = torch.cuda.is_available()
 gpu_count = torch.cuda.device_count()
 print("Available GPU count:" + str(gpu_count))
+print("Using dataloader workers:" + str(E.NUM_WORKERS))
 
+# inputs are always 224 x 224 so let cudnn autotune conv algorithms once
+torch.backends.cudnn.benchmark = True
 
-def checkpoint(model, last_train_loss, best_val_acc, metric, epoch, best_epoch, LR, WD):
+# training progress goes to results/logger through this logger's own handler
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+
+def attach_logfile():
+    """
+    Points the module logger at results/logger, keeping the file open for the run.
+
+    Any handler left from a previous run is closed first, since its results
+    directory may have been renamed since.
+
+    Args:
+        None
+    Returns:
+        None
     """
-    Saves checkpoint of torchvision model during training.
+    for handler in list(logger.handlers):
+        logger.removeHandler(handler)
+        handler.close()
+
+    handler = logging.FileHandler("results/logger")
+    handler.setFormatter(logging.Formatter("%(message)s"))
+    logger.addHandler(handler)
+
+
+def checkpoint(model, optimizer, last_train_loss, best_val_acc, metric, epoch, best_epoch, LR, WD):
+    """
+    Saves checkpoint of torchvision model state dict during training.
 
     Args:
-        model: torchvision model to be saved
+        model: torchvision model whose weights are saved
+        optimizer: optimizer whose state is saved
         best_loss: best val loss achieved so far in training
         epoch: current epoch of training
         LR: current learning rate in training
@@ -47,8 +79,10 @@ def checkpoint(model, last_train_loss, best_val_acc, metric, epoch, best_epoch,
         None
     """
     
+    # save weights of the underlying module so keys don't depend on torch.compile
     state = {
-        'model': model,
+        'model_state_dict': getattr(model, '_orig_mod', model).state_dict(),
+        'optimizer_state_dict': optimizer.state_dict(),
         'last_train_loss': last_train_loss,
         'best_val_acc': best_val_acc,
         'metric': metric,
@@ -71,7 +105,6 @@ def train_model(
         dataloaders,
         dataset_sizes,
         weight_decay,
-        dataset,
         data_transforms,
         PATH_TO_IMAGES,
         PATH_TO_CSV,
@@ -81,11 +114,11 @@ def train_model(
 
     Args:
         model: torchvision model to be finetuned (densenet-121 in this case)
-        criterion: loss criterion (binary cross entropy loss, BCELoss)
+        criterion: loss criterion (binary cross entropy loss on logits, BCEWithLogitsLoss)
         optimizer: optimizer to use in training (Adam)
         LR: learning rate
         num_epochs: continue training up to this many epochs
-        dataloaders: pytorch train and val dataloaders
+        dataloaders: pytorch train dataloader and unshuffled val dataloader used for eval
         dataset_sizes: length of train and val datasets
         weight_decay: weight decay parameter we use in SGD with momentum
     Returns:
@@ -102,24 +135,30 @@ def train_model(
     best_epoch = -1
     last_train_loss = -1
     last_val_acc = 0
+
+    # scales fp16 losses under mixed precision so small gradients don't underflow
+    scaler = torch.amp.GradScaler('cuda')
+
+    # train_cnn attaches the log file; do it here too when called on its own
+    if not logger.handlers:
+        attach_logfile()
     
     if val_on_dataset:
-        print("WARNING: VALIDATING ON DATASET")
-        with open("results/logger", 'a') as logfile:
-            logfile.write("WARNING: VALIDATING ON DATASET\n")
+        msg = "WARNING: VALIDATING ON DATASET"
+        print(msg)
+        logger.info(msg)
             
-    print(time.strftime("%d %b %Y %H:%M:%S", time.gmtime(time.time()-25200)))
-    with open("results/logger", 'a') as logfile:
-        logfile.write(time.strftime("%d %b %Y %H:%M:%S\n", time.gmtime(time.time()-25200)))
+    msg = time.strftime("%d %b %Y %H:%M:%S", time.gmtime(time.time()-25200))
+    print(msg)
+    logger.info(msg)
 
     # iterate over epochs
     for epoch in range(start_epoch, num_epochs + 1):
-        print('Epoch {}/{}'.format(epoch, num_epochs))
+        msg = 'Epoch {}/{}'.format(epoch, num_epochs)
+        print(msg)
+        logger.info(msg)
         print('-' * 10)
-        
-        with open("results/logger", 'a') as logfile:
-            logfile.write('Epoch {}/{}\n'.format(epoch, num_epochs))
-            logfile.write('-' * 10 + '\n')
+        logger.info('-' * 10)
 
         running_loss = 0.0
         running_misclass = 0
@@ -136,21 +175,25 @@ def train_model(
             inputs, labels, _ = data
             #print(labels)
             batch_size = inputs.shape[0]
-            inputs = Variable(inputs.cuda())
-            if str(criterion) == str(nn.BCELoss()):
-                labels = Variable(labels.cuda()).float()
+            inputs = inputs.cuda(non_blocking=True)
+            if isinstance(criterion, nn.BCEWithLogitsLoss):
+                labels = labels.cuda(non_blocking=True).float()
             else:
-                labels = Variable(labels.cuda()).long()
-            outputs = model(inputs)
+                labels = labels.cuda(non_blocking=True).long()
+
+            # run forward pass and loss in mixed precision
+            with torch.autocast('cuda'):
+                outputs = model(inputs)
+                loss = criterion(outputs, labels)
 
             # calculate gradient and update parameters in train phase
             optimizer.zero_grad()
-            loss = criterion(outputs, labels)
             
-            loss.backward()
-            optimizer.step()
+            scaler.scale(loss).backward()
+            scaler.step(optimizer)
+            scaler.update()
 
-            running_loss += loss.data.item() * batch_size
+            running_loss += loss.item() * batch_size
 
             #if phase == 'val' and str(criterion) == str(nn.CrossEntropyLoss()):
             #    print(labels)
@@ -159,22 +202,20 @@ def train_model(
 
         epoch_loss = running_loss / dataset_sizes['train']
 
-        print(time.strftime("%d %b %Y %H:%M:%S", time.gmtime(time.time()-25200)))
-        with open("results/logger", 'a') as logfile:
-            logfile.write(time.strftime("%d %b %Y %H:%M:%S\n", time.gmtime(time.time()-25200)))
+        msg = time.strftime("%d %b %Y %H:%M:%S", time.gmtime(time.time()-25200))
+        print(msg)
+        logger.info(msg)
 
-        print('train epoch {}: loss {:.4f} with data size {}'.format(
-            epoch, epoch_loss, dataset_sizes['train']))
-        with open("results/logger", 'a') as logfile:
-            logfile.write('train epoch {}: loss {:.4f} with data size {}\n'.format(
-            epoch, epoch_loss, dataset_sizes['train']))
+        msg = 'train epoch {}: loss {:.4f} with data size {}'.format(
+            epoch, epoch_loss, dataset_sizes['train'])
+        print(msg)
+        logger.info(msg)
 
         time_elapsed = time.time() - since
-        print('train epoch complete in {:.0f}m {:.0f}s'.format(
-            time_elapsed // 60, time_elapsed % 60))
-        with open("results/logger", 'a') as logfile:
-            logfile.write('train epoch complete in {:.0f}m {:.0f}s\n'.format(
-            time_elapsed // 60, time_elapsed % 60))
+        msg = 'train epoch complete in {:.0f}m {:.0f}s'.format(
+            time_elapsed // 60, time_elapsed % 60)
+        print(msg)
+        logger.info(msg)
 
         last_train_loss = epoch_loss
         
@@ -184,38 +225,31 @@ def train_model(
             
         # done with training
 
-        if str(criterion) == 'BCELoss()':
-            if val_on_dataset:
-                _, metric = E.make_pred_multilabel(data_transforms, model, 
-                                                   PATH_TO_IMAGES, PATH_TO_CSV, 'auc', dataset=dataset)
-            else:
-                _, metric = E.make_pred_multilabel(data_transforms, model, 
-                                                   PATH_TO_IMAGES, PATH_TO_CSV, 'auc')
-        else:
-            _, metric = E.make_pred_multilabel(data_transforms, model, 
-                                                   PATH_TO_IMAGES, PATH_TO_CSV, 'auc', dataset=dataset, multiclass=True)
+        # scored before the next epoch starts: LR decay, best epoch tracking and
+        # early stopping below all need this epoch's val AUC
+        _, metric = E.make_pred_multilabel(data_transforms, model, PATH_TO_IMAGES, PATH_TO_CSV, 'auc',
+                                           multiclass=not isinstance(criterion, nn.BCEWithLogitsLoss),
+                                           dataloader=dataloaders['val'])
 
-        auc = metric.as_matrix(columns=metric.columns[1:])
+        auc = metric[metric.columns[1:]].to_numpy(dtype=float)
         last_val_acc = auc[~np.isnan(auc)].mean() 
 
         print(metric)
-        with open("results/logger", 'a') as logfile:
-            print(metric, file=logfile)
+        logger.info(metric)
 
-        print('mean epoch validation accuracy:', last_val_acc)
-        with open("results/logger", 'a') as logfile:
-            logfile.write('mean epoch validation accuracy: ' + str(last_val_acc) + '\n')
+        msg = 'mean epoch validation accuracy: ' + str(last_val_acc)
+        print(msg)
+        logger.info(msg)
                 
         # decay learning rate if no val accuracy improvement in this epoch
         if last_val_acc < best_val_acc: 
-            print("Running with LR decay on val accuracy")
-            with open("results/logger", 'a') as logfile:
-                logfile.write("Running with LR decay on val accuracy\n")
-            print("decay loss from " + str(LR) + " to " +
-                  str(LR / 10) + " as not seeing improvement in val accuracy")
-            with open("results/logger", 'a') as logfile:
-                logfile.write("decay loss from " + str(LR) + " to " +
-                  str(LR / 10) + " as not seeing improvement in val accuracy\n")
+            msg = "Running with LR decay on val accuracy"
+            print(msg)
+            logger.info(msg)
+            msg = ("decay loss from " + str(LR) + " to " +
+                   str(LR / 10) + " as not seeing improvement in val accuracy")
+            print(msg)
+            logger.info(msg)
             LR = LR / 10
             optimizer = optim.Adam(
                 filter(
@@ -226,9 +260,9 @@ def train_model(
                 eps=1e-08,
                 weight_decay=weight_decay)
 
-            print("created new optimizer with LR " + str(LR))
-            with open("results/logger", 'a') as logfile:
-                    logfile.write("created new optimizer with LR " + str(LR) + '\n')
+            msg = "created new optimizer with LR " + str(LR)
+            print(msg)
+            logger.info(msg)
 
 
         # track best val accuracy yet
@@ -236,11 +270,6 @@ def train_model(
             best_val_acc = last_val_acc
             best_epoch = epoch
 
-        print('saving checkpoint_' + str(epoch))
-        with open("results/logger", 'a') as logfile:
-            logfile.write('saving checkpoint_' + str(epoch) + '\n')
-        checkpoint(model, last_train_loss, last_val_acc, metric, epoch, best_epoch, LR, weight_decay)
-
         # log training loss over each epoch
         with open("results/log_train", 'a') as logfile:
             logwriter = csv.writer(logfile, delimiter=',')
@@ -248,41 +277,47 @@ def train_model(
                 logwriter.writerow(["epoch", "train_loss", "average auc"])
             logwriter.writerow([epoch, last_train_loss, last_val_acc])
 
-        print("best epoch: ", best_epoch)
-        with open("results/logger", 'a') as logfile:
-            logfile.write("best epoch: " + str(best_epoch) + '\n')
+        msg = "best epoch: " + str(best_epoch)
+        print(msg)
+        logger.info(msg)
                     
-        print("best train loss: ", best_loss)
-        with open("results/logger", 'a') as logfile:
-            logfile.write("best train loss: " + str(best_loss) + '\n')
+        msg = "best train loss: " + str(best_loss)
+        print(msg)
+        logger.info(msg)
         
-        print("best val accuracy: ", best_val_acc)
-        with open("results/logger", 'a') as logfile:
-            logfile.write("best val accuracy: " + str(best_val_acc) + '\n')
+        msg = "best val accuracy: " + str(best_val_acc)
+        print(msg)
+        logger.info(msg)
                     
         total_done += batch_size
         if(total_done % (100 * batch_size) == 0):
-            print("completed " + str(total_done) + " so far in epoch")
-            with open("results/logger", 'a') as logfile:
-                logfile.write("completed " + str(total_done) + " so far in epoch\n")
+            msg = "completed " + str(total_done) + " so far in epoch"
+            print(msg)
+            logger.info(msg)
 
         # break if no val loss improvement in 3 epochs
         if ((epoch - best_epoch) >= 3):
-            print("no improvement in 3 epochs, break")
-            with open("results/logger", 'a') as logfile:
-                logfile.write("no improvement in 3 epochs, break\n")
+            msg = "no improvement in 3 epochs, break"
+            print(msg)
+            logger.info(msg)
             break
 
+        # only the best epoch is reloaded at the end, so only save that one
+        if best_epoch == epoch:
+            msg = 'saving checkpoint_' + str(epoch)
+            print(msg)
+            logger.info(msg)
+            checkpoint(model, optimizer, last_train_loss, last_val_acc, metric, epoch, best_epoch, LR, weight_decay)
+
     time_elapsed = time.time() - since
-    print('Training complete in {:.0f}m {:.0f}s'.format(
-        time_elapsed // 60, time_elapsed % 60))
-    with open("results/logger", 'a') as logfile:
-        logfile.write('Training complete in {:.0f}m {:.0f}s\n'.format(
-        time_elapsed // 60, time_elapsed % 60))
+    msg = 'Training complete in {:.0f}m {:.0f}s'.format(
+        time_elapsed // 60, time_elapsed % 60)
+    print(msg)
+    logger.info(msg)
 
     # load best model weights to return
-    checkpoint_best = torch.load('results/checkpoint_' + str(best_epoch))
-    model = checkpoint_best['model']
+    checkpoint_best = U.load_checkpoint('results/checkpoint_' + str(best_epoch))
+    getattr(model, '_orig_mod', model).load_state_dict(checkpoint_best['model_state_dict'])
 
     return model, best_epoch
 
@@ -316,17 +351,20 @@ def train_cnn(PATH_TO_IMAGES, PATH_TO_CSV, LR, WEIGHT_DECAY, orientation='all',
     except BaseException:
         pass  # directory doesn't yet exist, no need to clear it
     os.makedirs("results/")
+
+    attach_logfile()
     
     
     NUM_EPOCHS = 100
     BATCH_SIZE = 16
+    EVAL_BATCH_SIZE = 64
     
-    print("Running with WD, LR:", WEIGHT_DECAY, LR)
-    print("Using orientation:", orientation)
-    
-    with open("results/logger", 'a') as logfile:
-        logfile.write("Running with WD, LR: " + str(WEIGHT_DECAY) + ' ' + str(LR) + '\n')
-        logfile.write("Using orientation: " + orientation + '\n')
+    msg = "Running with WD, LR: " + str(WEIGHT_DECAY) + ' ' + str(LR)
+    print(msg)
+    logger.info(msg)
+    msg = "Using orientation: " + orientation
+    print(msg)
+    logger.info(msg)
 
     # use imagenet mean,std for normalization
     mean = [0.485, 0.456, 0.406]
@@ -338,40 +376,41 @@ def train_cnn(PATH_TO_IMAGES, PATH_TO_CSV, LR, WEIGHT_DECAY, orientation='all',
     
     # define torchvision transforms
     data_transforms = {
-        'val': transforms.Compose([
-            transforms.Resize(224),
-            transforms.CenterCrop(224),
-            transforms.ToTensor(),
-            transforms.Normalize(mean, std)
+        'val': v2.Compose([
+            # convert to uint8 tensor first so resize runs on the tensor kernels;
+            # resize + center crop matches run_chexpert's inference transforms
+            v2.PILToTensor(),
+            v2.Resize(224, antialias=True),
+            v2.CenterCrop(224),
+            v2.ToDtype(torch.float32, scale=True),
+            v2.Normalize(mean, std)
         ]),
     }
     
     if orientation == 'all':
-        data_transforms['train'] = transforms.Compose([
-            transforms.RandomHorizontalFlip(),
-            transforms.Resize(224), # changed for pytorch 4.0.1
-            # because scale doesn't always give 224 x 224, this ensures 224 x
-            # 224
-            transforms.CenterCrop(224),
-            transforms.ToTensor(),
-            transforms.Normalize(mean, std)
+        data_transforms['train'] = v2.Compose([
+            v2.PILToTensor(),
+            v2.RandomHorizontalFlip(),
+            v2.Resize(224, antialias=True),
+            v2.CenterCrop(224),
+            v2.ToDtype(torch.float32, scale=True),
+            v2.Normalize(mean, std)
         ])
-        print("Using random horizontal flip")
-        with open("results/logger", 'a') as logfile:
-            logfile.write("Using random horizontal flip\n")
+        msg = "Using random horizontal flip"
+        print(msg)
+        logger.info(msg)
     else:
-        data_transforms['train'] = transforms.Compose([
-            #transforms.RandomHorizontalFlip(),
-            transforms.Resize(224), # changed for pytorch 4.0.1
-            # because scale doesn't always give 224 x 224, this ensures 224 x
-            # 224
-            transforms.CenterCrop(224),
-            transforms.ToTensor(),
-            transforms.Normalize(mean, std)
+        data_transforms['train'] = v2.Compose([
+            v2.PILToTensor(),
+            #v2.RandomHorizontalFlip(),
+            v2.Resize(224, antialias=True),
+            v2.CenterCrop(224),
+            v2.ToDtype(torch.float32, scale=True),
+            v2.Normalize(mean, std)
         ])
-        print("Not using random horizontal flip")
-        with open("results/logger", 'a') as logfile:
-            logfile.write("Not using random horizontal flip\n")
+        msg = "Not using random horizontal flip"
+        print(msg)
+        logger.info(msg)
     
     print(data_transforms)
 
@@ -379,12 +418,11 @@ def train_cnn(PATH_TO_IMAGES, PATH_TO_CSV, LR, WEIGHT_DECAY, orientation='all',
     transformed_datasets = {}
     
     if cross_val_on_train == False: 
-        print("Not cross validating on train set")
-        with open("results/logger", 'a') as logfile:
-            logfile.write("Not cross validating on train set\n")
+        msg = "Not cross validating on train set"
+        print(msg)
+        logger.info(msg)
         print("On train: ", end=" ")
-        with open("results/logger", 'a') as logfile:
-            logfile.write("On train: ")
+        logger.info("On train: ")
         transformed_datasets['train'] = CXP.CXPDataset(
             path_to_images=PATH_TO_IMAGES,
             path_to_csv=PATH_TO_CSV,
@@ -396,8 +434,7 @@ def train_cnn(PATH_TO_IMAGES, PATH_TO_CSV, LR, WEIGHT_DECAY, orientation='all',
             verbose = True
         )
         print("On val: ", end=" ")
-        with open("results/logger", 'a') as logfile:
-            logfile.write("On val: ")
+        logger.info("On val: ")
         transformed_datasets['val'] = CXP.CXPDataset(
             path_to_images=PATH_TO_IMAGES,
             path_to_csv=PATH_TO_CSV,
@@ -411,12 +448,11 @@ def train_cnn(PATH_TO_IMAGES, PATH_TO_CSV, LR, WEIGHT_DECAY, orientation='all',
         #print(mask)
         #print(~mask)
         
-        print("Cross validating on train set")
-        with open("results/logger", 'a') as logfile:
-            logfile.write("Cross validating on train set\n")
+        msg = "Cross validating on train set"
+        print(msg)
+        logger.info(msg)
         print("On train: ", end=" ")
-        with open("results/logger", 'a') as logfile:
-            logfile.write("On train: ")
+        logger.info("On train: ")
         HEAD = 0.8
         transformed_datasets['train'] = CXP.CXPDataset(
             path_to_images=PATH_TO_IMAGES,
@@ -430,8 +466,7 @@ def train_cnn(PATH_TO_IMAGES, PATH_TO_CSV, LR, WEIGHT_DECAY, orientation='all',
             verbose = True
         )
         print("On val: ", end=" ")
-        with open("results/logger", 'a') as logfile:
-            logfile.write("On val: ")
+        logger.info("On val: ")
         transformed_datasets['val'] = CXP.CXPDataset(
             path_to_images=PATH_TO_IMAGES,
             path_to_csv=PATH_TO_CSV,
@@ -455,38 +490,60 @@ def train_cnn(PATH_TO_IMAGES, PATH_TO_CSV, LR, WEIGHT_DECAY, orientation='all',
         transformed_datasets['train'],
         batch_size=BATCH_SIZE,
         shuffle=True,
-        num_workers=8)
+        num_workers=E.NUM_WORKERS,
+        pin_memory=True,
+        persistent_workers=True,
+        prefetch_factor=2)
+
+    # eval runs on the full val fold unless cross validating on train or training
+    # the orientation classifier, in which case it runs on the val dataset above
+    if cross_val_on_train or orientation == 'trainer':
+        eval_dataset = transformed_datasets['val']
+    else:
+        eval_dataset = CXP.CXPDataset(
+            path_to_images=PATH_TO_IMAGES,
+            path_to_csv=PATH_TO_CSV,
+            fold='val',
+            transform=data_transforms['val'])
+
+    # eval loader is built once and reused every epoch, with fewer workers than
+    # the train loader so the two don't compete for cores
     dataloaders['val'] = torch.utils.data.DataLoader(
-        transformed_datasets['val'],
-        batch_size=BATCH_SIZE,
-        shuffle=True,
-        num_workers=8)
+        eval_dataset,
+        batch_size=EVAL_BATCH_SIZE,
+        shuffle=False,
+        num_workers=max(1, E.NUM_WORKERS // 2),
+        pin_memory=True,
+        persistent_workers=True,
+        prefetch_factor=2)
 
     # please do not attempt to train without GPU as will take excessively long
     if not use_gpu:
         raise ValueError("Error, requires GPU")
         
+    # add final layer with # outputs in same dimension of labels
     if PATH_TO_CHECKPOINT == None:
-        model = models.densenet121(pretrained=True)
-        num_ftrs = model.classifier.in_features
-        # add final layer with # outputs in same dimension of labels with sigmoid
-        # activation
         if orientation != 'trainer':
-            model.classifier = nn.Sequential(
-                nn.Linear(num_ftrs, N_LABELS), nn.Sigmoid())
+            model = U.build_densenet121(N_LABELS, pretrained=True)
         else:
-            model.classifier = nn.Sequential(
-                nn.Linear(num_ftrs, N_ORIENTS), nn.Softmax())
-
-        # put model on GPU
-        model = model.cuda()
+            model = U.build_densenet121(N_ORIENTS, pretrained=True)
     else:
-        checkpoint = torch.load(PATH_TO_CHECKPOINT)
-        model = checkpoint['model']
+        checkpoint = U.load_checkpoint(PATH_TO_CHECKPOINT)
+        model = U.model_from_checkpoint(checkpoint)
+        # training expects logits, so strip a legacy model's sigmoid/softmax
+        if U.has_activation(model):
+            model.classifier = nn.Sequential(*list(model.classifier.children())[:-1])
+
+    # put model on GPU
+    model = model.cuda()
+
+    # fuse the many small dense block ops and replay them with cuda graphs;
+    # the compiled model is reused for the eval passes during training
+    model = torch.compile(model, mode='reduce-overhead')
 
     # define criterion, optimizer for training
     if orientation != 'trainer':
-        criterion = nn.BCELoss()
+        criterion = nn.BCEWithLogitsLoss()
     else:
         criterion = nn.CrossEntropyLoss()
         
@@ -501,6 +558,15 @@ def train_cnn(PATH_TO_IMAGES, PATH_TO_CSV, LR, WEIGHT_DECAY, orientation='all',
         eps=1e-08,
         weight_decay=WEIGHT_DECAY,
     )
+
+    # resume optimizer state and learning rate where the checkpoint left off
+    if PATH_TO_CHECKPOINT != None and 'optimizer_state_dict' in checkpoint:
+        optimizer.load_state_dict(checkpoint['optimizer_state_dict'])
+        LR = checkpoint['LR']
+        msg = "Resumed optimizer from checkpoint with LR " + str(LR)
+        print(msg)
+        logger.info(msg)
+
     dataset_sizes = {x: len(transformed_datasets[x]) for x in ['train', 'val']}
     
     print("Model training start")
@@ -508,7 +574,7 @@ def train_cnn(PATH_TO_IMAGES, PATH_TO_CSV, LR, WEIGHT_DECAY, orientation='all',
     # train model
     model, best_epoch = train_model(model, criterion, optimizer, LR, num_epochs=NUM_EPOCHS,
                                     dataloaders=dataloaders, dataset_sizes=dataset_sizes, weight_decay=WEIGHT_DECAY, 
-                                    dataset=transformed_datasets['val'], data_transforms=data_transforms, 
+                                    data_transforms=data_transforms, 
                                     PATH_TO_IMAGES=PATH_TO_IMAGES, PATH_TO_CSV=PATH_TO_CSV, val_on_dataset=cross_val_on_train)
     
     print("Model training complete")
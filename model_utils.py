@@ -0,0 +1,120 @@
+import torch
+import torch.nn as nn
+from torchvision import models
+
+
+def build_densenet121(n_outputs, pretrained=False):
+    """
+    Builds densenet-121 with a final layer of n_outputs logits
+
+    Args:
+        n_outputs: number of labels (or orientation classes) to predict
+        pretrained: start from imagenet weights if True
+    Returns:
+        model: densenet-121 from torchvision with replaced classifier
+    """
+    if pretrained:
+        weights = models.DenseNet121_Weights.IMAGENET1K_V1
+    else:
+        weights = None
+
+    # memory efficient variant checkpoints dense layer intermediates,
+    # trading a little recompute in backward for larger batches
+    model = models.densenet121(weights=weights, memory_efficient=True)
+    num_ftrs = model.classifier.in_features
+    # outputs are logits, sigmoid/softmax is fused into the loss and applied in eval
+    model.classifier = nn.Sequential(
+        nn.Linear(num_ftrs, n_outputs))
+
+    return model
+
+
+def load_checkpoint(PATH_TO_CHECKPOINT):
+    """
+    Loads a checkpoint saved during training onto the CPU
+
+    Args:
+        PATH_TO_CHECKPOINT: path to checkpoint file
+    Returns:
+        checkpoint: dict of saved training state
+    """
+    # checkpoints also hold the metric dataframe, and legacy ones a whole
+    # pickled model, so they can't be loaded weights only
+    return torch.load(PATH_TO_CHECKPOINT, map_location=lambda storage, loc: storage,
+                      weights_only=False)
+
+
+def model_from_checkpoint(checkpoint):
+    """
+    Rebuilds the model stored in a checkpoint
+
+    Args:
+        checkpoint: dict returned by load_checkpoint
+    Returns:
+        model: densenet-121 with the checkpoint's weights; legacy checkpoints
+            return their pickled model, whose classifier ends in sigmoid/softmax
+    """
+    if 'model_state_dict' not in checkpoint:
+        model = checkpoint['model']
+        # pickled before densenet layers had memory_efficient and avg pools
+        # had divisor_override, both of which current forward passes read
+        for module in model.modules():
+            if isinstance(module, models.densenet._DenseLayer) and not hasattr(module, 'memory_efficient'):
+                module.memory_efficient = False
+            elif isinstance(module, nn.AvgPool2d) and not hasattr(module, 'divisor_override'):
+                module.divisor_override = None
+        return model
+
+    state_dict = checkpoint['model_state_dict']
+    model = build_densenet121(state_dict['classifier.0.weight'].shape[0])
+    model.load_state_dict(state_dict)
+
+    return model
+
+
+def load_model(PATH_TO_CHECKPOINT):
+    """
+    Loads the model stored in a checkpoint file onto the CPU
+
+    Args:
+        PATH_TO_CHECKPOINT: path to checkpoint file
+    Returns:
+        model: densenet-121 with the checkpoint's weights
+    """
+    return model_from_checkpoint(load_checkpoint(PATH_TO_CHECKPOINT))
+
+
+def has_activation(model):
+    """
+    Checks whether a densenet-121's classifier already ends in a sigmoid or softmax
+
+    Args:
+        model: densenet-121 from torchvision, optionally wrapped by torch.compile
+    Returns:
+        True if model outputs probabilities, False if it outputs logits
+    """
+    classifier = getattr(model, '_orig_mod', model).classifier
+    if isinstance(classifier, nn.Sequential) and len(classifier) > 0:
+        classifier = classifier[-1]
+    return isinstance(classifier, (nn.Sigmoid, nn.Softmax))
+
+
+def to_probs(model, outputs, multiclass=False):
+    """
+    Converts a densenet-121's outputs to probabilities
+
+    Checkpoints pickled before training moved to BCEWithLogitsLoss carry the
+    activation in the classifier; models trained since output logits.
+
+    Args:
+        model: densenet-121 the outputs came from
+        outputs: N x C tensor of model outputs
+        multiclass: True if outputs are orientation classes rather than labels
+    Returns:
+        probs: N x C tensor of probabilities
+    """
+    if has_activation(model):
+        return outputs
+    if multiclass:
+        return torch.softmax(outputs, dim=1)
+    return torch.sigmoid(outputs)
@@ -8,7 +8,6 @@ from torchvision import transforms, utils
 import sklearn
 import sklearn.metrics as sklm
 from sklearn.preprocessing import label_binarize
-from torch.autograd import Variable
 import numpy as np
 import sys
 
@@ -67,25 +66,24 @@ def run_chexpert(PATH_TO_IMAGES, PATH_TO_CSV, val=False):
     dataloader = torch.utils.data.DataLoader(
         dataset, BATCH_SIZE, shuffle=False, num_workers=8)
     
-    # create empty df
-    pred_df = pd.DataFrame(columns=["Image Index"])
-    
+    size = len(dataset)
+    n_labels = len(dataset.PRED_LABEL)
+
+    # preallocate predictions and labels, filled by slice per batch
+    probs_all = np.empty((size, n_labels), dtype=np.float32)
     if val:
-        true_df = pd.DataFrame(columns=["Image Index"])
-    
+        labels_all = np.empty((size, n_labels), dtype=np.int8)
+    offset = 0
     
     # iterate over dataloader
     for i, data in enumerate(dataloader):
 
         inputs, labels, _ = data
 
-        inputs = Variable(inputs.cuda())
+        inputs = inputs.cuda(non_blocking=True)
         
         if inputs.dim() == 3:
             inputs.unsqueeze_(0)
-            
-        if val:
-            true_labels = labels.cpu().data.numpy()
         
         batch_size = inputs.shape
         
@@ -94,33 +92,28 @@ def run_chexpert(PATH_TO_IMAGES, PATH_TO_CSV, val=False):
 
         probs = model.run(inputs)
         
-        # get predictions and true values for each item in batch
-        for j in range(0, batch_size[0]):
-            thisrow = {}            
-            
-            if val:
-                truerow = {}
-                truerow["Image Index"] = dataset.df.index[BATCH_SIZE * i + j]
-                thisrow["Image Index"] = dataset.df.index[BATCH_SIZE * i + j]
-            
-            else:
-                thisrow["Study"] = '/'.join(dataset.df.index[BATCH_SIZE * i + j].split("/")[0:-1])
-            
-            for k in range(len(dataset.PRED_LABEL)):
-                thisrow[dataset.PRED_LABEL[k]] = probs[j, k]
-                if val:
-                    truerow[dataset.PRED_LABEL[k]] = true_labels[j, k] 
-                    
-            pred_df = pred_df.append(thisrow, ignore_index=True)
-            if val:
-                true_df = true_df.append(truerow, ignore_index=True)
+        # write predictions and true values for the batch into their slice
+        probs_all[offset:offset + batch_size[0]] = probs
+        if val:
+            labels_all[offset:offset + batch_size[0]] = labels.detach().cpu().numpy()
+        offset += batch_size[0]
+
+    # build dfs once from the full prediction and label matrices
+    image_index = dataset.image_paths
+    pred_df = pd.DataFrame(probs_all, columns=dataset.PRED_LABEL)
+    if val:
+        pred_df.insert(0, "Image Index", image_index)
+        true_df = pd.DataFrame(labels_all, columns=dataset.PRED_LABEL)
+        true_df.insert(0, "Image Index", image_index)
+    else:
+        pred_df.insert(0, "Study", ['/'.join(path.split("/")[0:-1]) for path in image_index])
                 
     # take the mean of predictions if images are from the same study
     pred_df = pred_df.groupby('Study', as_index=False).mean()
                 
     if val:
             
-        auc_df = pd.DataFrame(columns=["label", "auc"])
+        auc_rows = []
 
         for column in true_df:
 
@@ -148,15 +141,16 @@ def run_chexpert(PATH_TO_IMAGES, PATH_TO_CSV, val=False):
             thisrow['auc'] = np.nan
             try:
                 thisrow['auc'] = sklm.roc_auc_score(
-                    actual.as_matrix().astype(int), pred.as_matrix())
+                    actual.to_numpy().astype(int), pred.to_numpy())
             except BaseException:
                 if verbose:
                     print("can't calculate auc for " + str(column))
-            auc_df = auc_df.append(thisrow, ignore_index=True)
+            auc_rows.append(thisrow)
 
+        auc_df = pd.DataFrame(auc_rows, columns=["label", "auc"])
         print(auc_df)
         
-        auc = auc_df.as_matrix(columns=auc_df.columns[1:])
+        auc = auc_df[auc_df.columns[1:]].to_numpy(dtype=float)
         last_val_acc = auc[~np.isnan(auc)].mean()
         
         print("mean_val_acc:", last_val_acc)
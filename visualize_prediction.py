@@ -22,6 +22,7 @@ import pandas as pd
 from copy import deepcopy
 import cxr_dataset as CXR
 import eval_model as E
+import model_utils as U
 
 def calc_cam(x, label, model):
     """
@@ -77,9 +78,8 @@ def calc_cam(x, label, model):
 
     # instantiate cam model and get output
     model_cam = densenet_last_layer(model)
-    x = torch.autograd.Variable(x)
     y = model_cam(x)
-    y = y.cpu().data.numpy()
+    y = y.detach().cpu().numpy()
     y = np.squeeze(y)
 
     # pull weights corresponding to the 1024 layers from model
@@ -167,12 +167,10 @@ def load_data(
         model: fine tuned torchvision densenet-121
     """
 
-    checkpoint = torch.load(PATH_TO_MODEL, map_location=lambda storage, loc: storage)
-    model = checkpoint['model']
+    model = U.load_model(PATH_TO_MODEL)
     for i, (name, module) in enumerate(model._modules.items()):
         module = recursion_change_bn(model)
     
-    del checkpoint
     model.cpu()
 
     # build dataloader on test
@@ -196,7 +194,7 @@ def load_data(
         'Hernia']
 
     data_transform = transforms.Compose([
-        transforms.Scale(224),
+        transforms.Resize(224),
         transforms.CenterCrop(224),
         transforms.ToTensor(),
         transforms.Normalize(mean, std)
@@ -262,7 +260,8 @@ def show_next(dataloader, model, LABEL):
     raw_cam = calc_cam(inputs, LABEL, model)
     
     # create predictions for label of interest and all labels
-    pred = model(torch.autograd.Variable(original.cpu())).data.numpy()[0]
+    pred = U.to_probs(model, model(original.cpu()).detach())
+    pred = pred.numpy()[0]
     predx = ['%.3f' % elem for elem in list(pred)]
     
     fig, (showcxr,heatmap) =plt.subplots(ncols=2,figsize=(14,5))